@@ -2,62 +2,178 @@
 Synthetic Workflow Simulator (Synthetic-WF)
 A custom mini-workflow engine implementing all plan requirements.
 """
+import array
+import functools
+import heapq
 import json
+import os
+import re
+import shlex
 import subprocess
 import threading
-import time
 from collections import deque
-from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from enum import IntEnum
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import numba as nb
+except ImportError:
+    nb = None
 
 
 # ============================================================================
 # MODELS
 # ============================================================================
 
+class Status(IntEnum):
+    """Step lifecycle states.
+
+    An IntEnum so hot-path status checks are single integer compares
+    instead of string hashing; use ``.name`` for display.
+    """
+    PENDING = 0
+    READY = 1
+    RUNNING = 2
+    SUCCESS = 3
+    FAILED = 4
+    SKIPPED = 5
+
+
 class Step:
-    """Represents a single step in the workflow."""
-    
+    """Represents a single step in the workflow.
+
+    Slotted: with thousands of steps the per-instance __dict__ would
+    dominate memory, and slot access is also a little faster.
+    """
+
+    __slots__ = ("id", "index", "command", "argv", "dependencies", "deps",
+                 "rev_deps", "condition", "compiled_cond", "failure_strategy",
+                 "parallel_with", "status", "retry_count")
+
     def __init__(self, step_id: str, command: str):
         self.id = step_id
+        self.index = -1  # Dense integer id, assigned by Workflow.add_step
         self.command = command
+        self.argv = None  # Pre-split argv when the command needs no shell
         self.dependencies = []
+        self.deps = []  # Direct Step references, resolved after parsing
+        self.rev_deps = []  # Steps that depend on this one
         self.condition = None
+        self.compiled_cond = None  # (target_step_id, expected Status) or None
         self.failure_strategy = None
         self.parallel_with = []  # Hint for parallel execution
-        self.status = "PENDING"  # PENDING, READY, RUNNING, SUCCESS, FAILED, SKIPPED
+        self.status = Status.PENDING
         self.retry_count = 0
 
 
 class Workflow:
     """Represents the entire workflow as a graph structure."""
-    
+
+    __slots__ = ("name", "steps", "inverse_dependencies", "_edges", "levels",
+                 "indeg", "fwd_indptr", "fwd_indices", "rev_indptr", "rev_indices")
+
     def __init__(self, name: str):
         self.name = name
         self.steps = {}  # Dictionary of step_id to Step objects
         self.inverse_dependencies = {}  # Dictionary of step_id to list of dependent steps
+        self._edges = set()  # (dependent, dependency) pairs, for dedup
+        self.levels = None  # Depth per step id, filled in by analyze()
+        # SoA/CSR graph arrays, built by finalize(): in-degrees plus
+        # forward (dependency) and reverse (dependent) adjacency
+        self.indeg = None
+        self.fwd_indptr = None
+        self.fwd_indices = None
+        self.rev_indptr = None
+        self.rev_indices = None
     
     def add_step(self, step: Step):
         """Add a step to the workflow."""
+        step.index = len(self.steps)
         self.steps[step.id] = step
         self.inverse_dependencies[step.id] = []
     
     def add_dependency(self, dependent_id: str, dependency_id: str):
-        """Add a dependency between steps."""
+        """Add a dependency between steps, ignoring duplicate edges.
+
+        A definition that lists the same dependency twice must not
+        create a double edge: the in-degree counters would then be
+        decremented twice per completion and readiness would misfire.
+        """
         if dependent_id in self.steps and dependency_id in self.steps:
+            edge = (dependent_id, dependency_id)
+            if edge in self._edges:
+                return
+            self._edges.add(edge)
             self.steps[dependent_id].dependencies.append(dependency_id)
             self.inverse_dependencies[dependency_id].append(dependent_id)
 
+    def finalize(self):
+        """Freeze the graph into flat CSR arrays for analysis kernels.
+
+        The Step objects keep command/status metadata; the structural
+        data (in-degrees and both edge directions) moves into dense
+        int arrays indexed by step.index, which the cycle/level pass
+        walks without touching Python objects.  Uses int32 NumPy
+        arrays when NumPy is installed, array.array otherwise.  Call
+        after the graph is fully constructed.
+        """
+        steps = list(self.steps.values())
+        make = (lambda seq: np.array(seq, dtype=np.int32)) if np is not None \
+            else (lambda seq: array.array('i', seq))
+
+        indeg = []
+        fwd_indptr, fwd_indices = [0], []
+        rev_indptr, rev_indices = [0], []
+        for step in steps:
+            indeg.append(len(step.dependencies))
+            fwd_indices.extend(self.steps[dep_id].index for dep_id in step.dependencies)
+            fwd_indptr.append(len(fwd_indices))
+            rev_indices.extend(self.steps[sid].index for sid in self.inverse_dependencies[step.id])
+            rev_indptr.append(len(rev_indices))
+
+        self.indeg = make(indeg)
+        self.fwd_indptr = make(fwd_indptr)
+        self.fwd_indices = make(fwd_indices)
+        self.rev_indptr = make(rev_indptr)
+        self.rev_indices = make(rev_indices)
+
 
 # ============================================================================
 # DSL PARSER
 # ============================================================================
 
-def parse_workflow(file_path: str) -> Workflow:
-    """Parse a workflow definition file and return a Workflow object."""
-    
-    with open(file_path, 'r') as f:
-        data = json.load(f)
-    
+# Commands containing any of these need a real shell (pipes, globs,
+# substitutions, ...); everything else can exec its argv directly.
+_SHELL_META = re.compile(r"[|&;<>()$`*?\[\]{}~\n]")
+
+def _load_workflow_file(file_path: str):
+    """Load a workflow definition, preferring orjson when available."""
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+@functools.lru_cache(maxsize=32)
+def _parse_cached(file_path: str, mtime_ns: int, size: int):
+    """Read and normalize a definition file, memoized on file identity.
+
+    Returns an immutable (name, step_defs) prototype; the step-def
+    dicts are shared across builds but only ever read, which is much
+    cheaper than deep-copying a parsed Workflow.  The mtime/size key
+    means an edited file parses fresh.
+    """
+    data = _load_workflow_file(file_path)
+
     # Support both formats: {"workflow": "name", "steps": [...]} and [...]
     workflow_name = "default"
     if isinstance(data, dict):
@@ -66,16 +182,34 @@ def parse_workflow(file_path: str) -> Workflow:
             data = data["steps"]
         else:
             raise ValueError("No steps found in workflow definition")
-    
+
+    return workflow_name, tuple(data)
+
+
+def parse_workflow(file_path: str) -> Workflow:
+    """Parse a workflow definition file and return a Workflow object.
+
+    Repeated parses of an unchanged file reuse the cached definition
+    and only rebuild the mutable Step graph, so per-run status never
+    leaks between engine runs.
+    """
+    stat = os.stat(file_path)
+    workflow_name, data = _parse_cached(file_path, stat.st_mtime_ns, stat.st_size)
+
     workflow = Workflow(workflow_name)
-    
-    # First pass: Create all steps
+
+    # Single pass over the definitions: create each step and wire its
+    # dependencies immediately; edges pointing at steps defined later
+    # in the file go on a small pending list drained afterwards.
+    pending = []
     for step_def in data:
         step_id = step_def["step_id"]
         command = step_def["run"]
-        
+
         step = Step(step_id, command)
-        
+        if not _SHELL_META.search(command):
+            step.argv = shlex.split(command)
+
         # Add optional attributes
         if "if" in step_def:
             step.condition = step_def["if"]
@@ -83,45 +217,150 @@ def parse_workflow(file_path: str) -> Workflow:
             step.failure_strategy = step_def["on_failure"]
         if "parallel_with" in step_def:
             step.parallel_with = step_def["parallel_with"]
-        
+
         workflow.add_step(step)
-    
-    # Second pass: Add dependencies
-    for step_def in data:
-        step_id = step_def["step_id"]
-        if "depends_on" in step_def:
-            for dep_id in step_def["depends_on"]:
+
+        for dep_id in step_def.get("depends_on", ()):
+            if dep_id in workflow.steps:
                 workflow.add_dependency(step_id, dep_id)
-    
+            else:
+                pending.append((step_id, dep_id))
+
+    for step_id, dep_id in pending:
+        workflow.add_dependency(step_id, dep_id)
+
+    # Final pass over the (now complete) graph: compile conditions and
+    # resolve id strings to direct Step references so the engine's hot
+    # paths chase attributes instead of hashing ids
+    for step in workflow.steps.values():
+        step.compiled_cond = _compile_condition(step.condition, workflow)
+        step.deps = [workflow.steps[dep_id] for dep_id in step.dependencies]
+        step.rev_deps = [workflow.steps[sid] for sid in workflow.inverse_dependencies[step.id]]
+
     return workflow
 
 
+def _compile_condition(condition, workflow: Workflow):
+    """Compile an ``if:`` expression into a (target_id, expected) pair.
+
+    Parsing the string once here means the ready-time check is just a
+    pair of dict lookups and a string compare.  Unrecognized
+    expressions compile to None, which evaluates as always-true (the
+    previous runtime behaviour).
+    """
+    if not condition:
+        return None
+
+    parts = condition.replace("==", " == ").split()
+    if len(parts) >= 3:
+        var_name = parts[0]
+        expected_value = parts[2].strip("'\"")
+
+        if var_name.startswith(("status_", "result_")):
+            target_id = var_name.split("_", 1)[1]
+            if target_id in workflow.steps:
+                # A value that is not a known status can never match
+                expected = Status.__members__.get(expected_value.upper())
+                return (target_id, expected)
+
+    return None
+
+
+def _kahn_levels(indeg, rev_indptr, rev_indices):
+    """Kahn peel over CSR arrays: returns (levels, processed count).
+
+    Pure integer loop over flat arrays; mutates indeg in place, so
+    callers pass a copy.
+    """
+    n = len(indeg)
+    levels = [0] * n
+    frontier = [u for u in range(n) if indeg[u] == 0]
+    processed = 0
+
+    while frontier:
+        next_frontier = []
+        for u in frontier:
+            processed += 1
+            succ_level = levels[u] + 1
+            for k in range(rev_indptr[u], rev_indptr[u + 1]):
+                v = rev_indices[k]
+                if succ_level > levels[v]:
+                    levels[v] = succ_level
+                indeg[v] -= 1
+                if indeg[v] == 0:
+                    next_frontier.append(v)
+        frontier = next_frontier
+
+    return levels, processed
+
+
+if np is not None and nb is not None:
+    @nb.njit(cache=True)
+    def _kahn_levels_jit(indeg, rev_indptr, rev_indices):
+        """Native-compiled _kahn_levels for the NumPy CSR arrays."""
+        n = indeg.shape[0]
+        levels = np.zeros(n, dtype=np.int32)
+        frontier = np.empty(n, dtype=np.int32)
+        next_frontier = np.empty(n, dtype=np.int32)
+
+        count = 0
+        for u in range(n):
+            if indeg[u] == 0:
+                frontier[count] = u
+                count += 1
+
+        processed = 0
+        while count > 0:
+            next_count = 0
+            for i in range(count):
+                u = frontier[i]
+                processed += 1
+                succ_level = levels[u] + 1
+                for k in range(rev_indptr[u], rev_indptr[u + 1]):
+                    v = rev_indices[k]
+                    if succ_level > levels[v]:
+                        levels[v] = succ_level
+                    indeg[v] -= 1
+                    if indeg[v] == 0:
+                        next_frontier[next_count] = v
+                        next_count += 1
+            frontier, next_frontier = next_frontier, frontier
+            count = next_count
+
+        return levels, processed
+else:
+    _kahn_levels_jit = None
+
+
+def analyze(workflow: Workflow) -> dict:
+    """Cycle-check the workflow and compute per-step depth levels.
+
+    Runs the Kahn peel over the workflow's CSR arrays (building them
+    if needed): peel steps with no unprocessed dependencies, assigning
+    each successor the maximum predecessor level plus one.  If fewer
+    than all steps get peeled, the remainder must lie on a cycle.  The
+    levels are cached on the workflow so repeated engine runs over the
+    same graph don't recompute them.
+    """
+    if workflow.indeg is None:
+        workflow.finalize()
+
+    indeg = workflow.indeg.copy() if np is not None \
+        else array.array('i', workflow.indeg)
+    kernel = _kahn_levels_jit if _kahn_levels_jit is not None else _kahn_levels
+    levels, processed = kernel(indeg, workflow.rev_indptr, workflow.rev_indices)
+
+    if processed != len(workflow.steps):
+        remaining = [s.id for s in workflow.steps.values() if indeg[s.index] > 0]
+        raise ValueError(f"Cycle detected in workflow involving steps {remaining}")
+
+    workflow.levels = {s.id: levels[s.index] for s in workflow.steps.values()}
+    return workflow.levels
+
+
 def validate_workflow(workflow: Workflow) -> bool:
     """Validate workflow structure for cycles."""
-    visited = set()
-    temp_visited = set()
-    
-    def has_cycle(step_id):
-        if step_id in temp_visited:
-            return True
-        if step_id in visited:
-            return False
-        
-        temp_visited.add(step_id)
-        step = workflow.steps[step_id]
-        
-        for dep_id in step.dependencies:
-            if has_cycle(dep_id):
-                return True
-        
-        temp_visited.remove(step_id)
-        visited.add(step_id)
-        return False
-    
-    for step_id in workflow.steps:
-        if has_cycle(step_id):
-            raise ValueError(f"Cycle detected in workflow involving step {step_id}")
-    
+    analyze(workflow)
     return True
 
 
@@ -129,245 +368,344 @@ def validate_workflow(workflow: Workflow) -> bool:
 # SCHEDULING STRATEGIES
 # ============================================================================
 
-class SchedulingStrategy(ABC):
-    """Abstract base class for scheduling strategies."""
-    
-    @abstractmethod
-    def get_next_steps(self, ready_steps: list) -> list:
-        """Return the next steps to execute based on the strategy."""
-        pass
+def _make_priority(strategy_name: str, levels: dict):
+    """Build the heap priority function for a scheduling strategy.
 
+    BFS pops shallower steps first, DFS pops deeper ones; anything
+    else falls back to insertion order.
+    """
+    if strategy_name == "bfs":
+        return lambda step: levels[step.id]
+    if strategy_name == "dfs":
+        return lambda step: -levels[step.id]
+    return lambda step: 0
 
-def _calculate_levels(workflow: Workflow):
-    """Calculate depth level for each step."""
-    levels = {}
-    
-    def get_level(step_id):
-        if step_id in levels:
-            return levels[step_id]
-        
-        step = workflow.steps[step_id]
-        if not step.dependencies:
-            levels[step_id] = 0
-        else:
-            levels[step_id] = 1 + max(get_level(dep) for dep in step.dependencies)
-        
-        return levels[step_id]
-    
-    for step_id in workflow.steps:
-        get_level(step_id)
-    
-    return levels
 
+# ============================================================================
+# WORKFLOW ENGINE
+# ============================================================================
 
-class BreadthFirstStrategy(SchedulingStrategy):
-    """Breadth-first execution strategy - processes by levels."""
-    
-    def __init__(self, workflow: Workflow):
-        self.levels = _calculate_levels(workflow)
-    
-    def get_next_steps(self, ready_steps: list) -> list:
-        if not ready_steps:
-            return []
-        # Sort by level (shallower first)
-        return [min(ready_steps, key=lambda s: self.levels[s.id])]
-
+def _run_command(step_id: str, command: str, argv=None) -> bool:
+    """Run a step's command and return whether it succeeded.
 
-class DepthFirstStrategy(SchedulingStrategy):
-    """Depth-first execution strategy - prioritizes deeper paths."""
-    
-    def __init__(self, workflow: Workflow):
-        self.levels = _calculate_levels(workflow)
-    
-    def get_next_steps(self, ready_steps: list) -> list:
-        if not ready_steps:
-            return []
-        # Sort by level (deeper first)
-        return [max(ready_steps, key=lambda s: self.levels[s.id])]
+    Pre-split argv (computed once at parse time) avoids forking a shell
+    just to tokenize the command line; shell=True is kept only for
+    commands with real shell syntax.  Output is streamed line by line
+    rather than buffered, so chatty commands don't grow memory.
+    Module-level so it can be pickled for a ProcessPoolExecutor.
+    """
+    try:
+        proc = subprocess.Popen(argv if argv is not None else command,
+                                shell=argv is None,
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                text=True, bufsize=1)
+    except OSError:
+        return False
 
+    for line in proc.stdout:
+        print(f"[{step_id}] {line.rstrip()}")
 
-# ============================================================================
-# WORKFLOW ENGINE
-# ============================================================================
+    return proc.wait() == 0
 
 class WorkflowEngine:
     """Engine for executing workflow graphs."""
     
-    def __init__(self, workflow: Workflow, strategy=None, max_parallel=1):
+    def __init__(self, workflow: Workflow, strategy=None, max_parallel=1,
+                 use_processes=False, verbose=True):
         self.workflow = workflow
-        self.ready_queue = deque()
-        self.strategy = strategy
+        # Stable snapshot of the steps; iterating a plain list avoids
+        # dict-view overhead in the engine's loops
+        self._all_steps = list(workflow.steps.values())
+        # Min-heap of (priority, insertion_seq, step); the seq tiebreaker
+        # keeps pops stable and means Step objects are never compared.
+        self.ready_queue = []
+        # analyze() also cycle-checks; reuse cached levels when present
+        self.levels = workflow.levels if workflow.levels is not None else analyze(workflow)
+        self._priority = _make_priority(strategy, self.levels)
+        self._seq = 0
         self.max_parallel = max_parallel
-        self.running_threads = []
+        self.use_processes = use_processes
+        self.verbose = verbose
+        # Step ids whose status changed since the last visualization;
+        # only these rows get reprinted.
+        self.dirty = set()
+        self.running_count = 0
         self.lock = threading.Lock()
+        # Workers notify this when a step finishes, so the scheduler
+        # wakes exactly when there is actionable state instead of polling.
+        self.cv = threading.Condition(self.lock)
         self.execution_order = []
-    
+        # Kahn-style in-degree counters, indexed by step.index: how many
+        # dependencies each step still waits on.  A flat int array with
+        # its own narrow lock, so completions don't serialize against
+        # the scheduler's condition-variable lock.
+        self.remaining = array.array('i', [len(s.dependencies) for s in workflow.steps.values()])
+        self._counter_lock = threading.Lock()
+
     def execute(self):
         """Execute the workflow."""
         print(f"Starting workflow: {self.workflow.name}")
-        self._update_ready_queue()
-        
+
         if self.max_parallel == 1:
             self._execute_sequential()
         else:
-            self._execute_parallel()
-        
+            # Steps on the same level are independent, so the BSP path
+            # schedules whole layers at once with far less locking
+            self.execute_bsp()
+
         print(f"Completed workflow: {self.workflow.name}")
         print("Execution order:", " -> ".join(self.execution_order))
+
+    def _seed_ready_queue(self):
+        """Enqueue all steps that start with no dependencies."""
+        for step in self._all_steps:
+            if self.remaining[step.index] == 0:
+                self._mark_ready(step)
     
     def _get_next_step(self):
-        """Get next step to execute based on strategy."""
-        if self.strategy:
-            ready_steps = list(self.ready_queue)
-            next_steps = self.strategy.get_next_steps(ready_steps)
-            return next_steps[0] if next_steps else None
-        return self.ready_queue.popleft() if self.ready_queue else None
-    
+        """Pop the highest-priority ready step, or None.
+
+        Skipped steps are left in the heap as tombstones (cheaper than
+        removing them eagerly), so pop until one is actually READY.
+        """
+        while self.ready_queue:
+            step = heapq.heappop(self.ready_queue)[2]
+            if step.status is Status.READY:
+                return step
+        return None
+
     def _execute_sequential(self):
         """Execute workflow sequentially."""
+        self._seed_ready_queue()
         while self.ready_queue:
             step = self._get_next_step()
             if not step:
                 break
-            
-            if step in self.ready_queue:
-                self.ready_queue.remove(step)
-            
-            step.status = "RUNNING"
+
+            step.status = Status.RUNNING
+            self.dirty.add(step.id)
             success = self._execute_step(step)
-            
-            if not success and step.status == "FAILED":
-                self._skip_dependents(step.id)
-            
-            self._update_ready_queue()
+
+            if success:
+                self._notify_completed(step)
+            elif step.status is Status.FAILED:
+                self._skip_dependents(step)
+            elif step.status is Status.PENDING:
+                # Retry requested: dependencies are already satisfied
+                self._mark_ready(step)
+
             self.visualize_workflow()
     
     def _execute_parallel(self):
-        """Execute workflow with parallel support."""
-        while self.ready_queue or self.running_threads:
-            self.running_threads = [t for t in self.running_threads if t.is_alive()]
-            
-            while (len(self.running_threads) < self.max_parallel and self.ready_queue):
-                step = self._get_next_step()
-                if not step:
-                    break
-                
-                if step in self.ready_queue:
-                    self.ready_queue.remove(step)
-                
-                step.status = "RUNNING"
-                thread = threading.Thread(target=self._execute_step_threaded, args=(step,))
-                thread.start()
-                self.running_threads.append(thread)
-            
-            time.sleep(0.1)
-            with self.lock:
+        """Execute workflow on a reusable worker pool.
+
+        Steps are submitted to a ThreadPoolExecutor (thread reuse
+        avoids per-step thread startup), or a ProcessPoolExecutor when
+        use_processes is set for CPU-bound commands.  Completion is
+        handled by future callbacks rather than joining threads.
+        """
+        self._seed_ready_queue()
+        executor_cls = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        with executor_cls(max_workers=self.max_parallel) as pool:
+            with self.cv:
+                while self.ready_queue or self.running_count:
+                    while self.running_count < self.max_parallel and self.ready_queue:
+                        step = self._get_next_step()
+                        if not step:
+                            break
+
+                        step.status = Status.RUNNING
+                        self.dirty.add(step.id)
+                        self.running_count += 1
+                        print(f"Starting step {step.id}: {step.command}")
+                        self.execution_order.append(step.id)
+                        future = pool.submit(_run_command, step.id, step.command, step.argv)
+                        future.add_done_callback(
+                            lambda fut, step=step: self._on_step_done(step, fut)
+                        )
+
+                    # Sleep until a callback frees a slot (or everything is done)
+                    self.cv.wait_for(
+                        lambda: not self.running_count
+                        or (self.ready_queue and self.running_count < self.max_parallel)
+                    )
+    
+    def execute_bsp(self):
+        """Execute the workflow level by level in BSP fashion.
+
+        Steps within one topological level are independent, so each
+        layer is submitted to the pool as a single batch with a
+        barrier before the next layer.  Scheduling and bookkeeping
+        happen once per layer instead of once per step, and no lock is
+        needed because the engine only touches state between batches.
+        """
+        layers = {}
+        for step in self._all_steps:
+            layers.setdefault(self.levels[step.id], []).append(step)
+
+        executor_cls = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        with executor_cls(max_workers=self.max_parallel) as pool:
+            for level in sorted(layers):
+                batch = []
+                for step in layers[level]:
+                    if step.status is not Status.PENDING:
+                        continue
+                    if not all(dep.status is Status.SUCCESS for dep in step.deps):
+                        continue
+                    if self._check_condition(step):
+                        step.status = Status.RUNNING
+                        self.dirty.add(step.id)
+                        batch.append(step)
+                    else:
+                        step.status = Status.SKIPPED
+                        self.dirty.add(step.id)
+
+                # Re-run the shrinking batch until retries are exhausted
+                while batch:
+                    futures = []
+                    for step in batch:
+                        print(f"Starting step {step.id}: {step.command}")
+                        self.execution_order.append(step.id)
+                        futures.append(pool.submit(_run_command, step.id, step.command, step.argv))
+
+                    retries = []
+                    for step, future in zip(batch, futures):
+                        if self._apply_result(step, future.result()):
+                            continue
+                        if step.status is Status.FAILED:
+                            self._skip_dependents(step)
+                        else:
+                            step.status = Status.RUNNING
+                            retries.append(step)
+                    batch = retries
+
                 self.visualize_workflow()
-    
+
     def _execute_step(self, step: Step) -> bool:
         """Execute a step by running its command."""
         print(f"Starting step {step.id}: {step.command}")
         self.execution_order.append(step.id)
-        
-        try:
-            result = subprocess.run(step.command, shell=True, check=True,
-                                  capture_output=True, text=True)
-            success = result.returncode == 0
-            if result.stdout:
-                print(f"[{step.id}] {result.stdout.strip()}")
-        except subprocess.CalledProcessError:
-            success = False
-        
+
+        success = _run_command(step.id, step.command, step.argv)
+        return self._apply_result(step, success)
+
+    def _apply_result(self, step: Step, success: bool) -> bool:
+        """Set the step's final status, applying the retry strategy."""
+        self.dirty.add(step.id)
         if success:
-            step.status = "SUCCESS"
+            step.status = Status.SUCCESS
         else:
             if step.failure_strategy and step.failure_strategy.startswith("retry:"):
                 max_retries = int(step.failure_strategy.split(":")[1].strip())
                 if step.retry_count < max_retries:
                     step.retry_count += 1
-                    step.status = "PENDING"
+                    step.status = Status.PENDING
                     return False
-            
-            step.status = "FAILED"
-        
+
+            step.status = Status.FAILED
+
         return success
-    
-    def _execute_step_threaded(self, step: Step):
-        """Execute a step in a separate thread."""
-        success = self._execute_step(step)
-        
-        with self.lock:
-            if not success and step.status == "FAILED":
-                self._skip_dependents(step.id)
-            self._update_ready_queue()
-    
-    def _evaluate_condition(self, condition: str) -> bool:
-        """Evaluate a step's condition."""
-        if not condition:
+
+    def _on_step_done(self, step: Step, future):
+        """Pool callback: record a step's result and release its slot.
+
+        The common success path decrements counters outside the main
+        lock; only the heap push, the rare failure cascade, and the
+        scheduler wakeup run under the condition variable.
+        """
+        newly_ready = None
+        if self._apply_result(step, future.result()):
+            newly_ready = self._decrement_successors(step)
+
+        with self.cv:
+            if newly_ready is not None:
+                for succ in newly_ready:
+                    self._mark_ready(succ)
+            elif step.status is Status.FAILED:
+                self._skip_dependents(step)
+            else:
+                # Retry requested: re-enqueue for the scheduler loop
+                self._mark_ready(step)
+            self.running_count -= 1
+            self.cv.notify_all()
+    
+    def _check_condition(self, step: Step) -> bool:
+        """Evaluate a step's precompiled condition."""
+        if step.compiled_cond is None:
             return True
-        
-        parts = condition.replace("==", " == ").split()
-        if len(parts) >= 3:
-            var_name = parts[0]
-            expected_value = parts[2].strip("'\"")
-            
-            if var_name.startswith(("status_", "result_")):
-                step_id = var_name.split("_", 1)[1]
-                if step_id in self.workflow.steps:
-                    actual_status = self.workflow.steps[step_id].status
-                    return actual_status.lower() == expected_value.lower()
-        
-        return True
-    
-    def _update_ready_queue(self):
-        """Update the queue of steps ready to execute."""
-        for step in self.workflow.steps.values():
-            if step.status != "PENDING":
-                continue
-            
-            deps_satisfied = all(
-                self.workflow.steps[dep_id].status == "SUCCESS"
-                for dep_id in step.dependencies
-            )
-            
-            if deps_satisfied and self._evaluate_condition(step.condition):
-                step.status = "READY"
-                self.ready_queue.append(step)
-            elif deps_satisfied and step.condition and not self._evaluate_condition(step.condition):
-                step.status = "SKIPPED"
-    
-    def _skip_dependents(self, step_id: str):
+        target_id, expected = step.compiled_cond
+        return self.workflow.steps[target_id].status is expected
+    
+    def _mark_ready(self, step: Step):
+        """Evaluate a step's condition and enqueue it (or skip it)."""
+        self.dirty.add(step.id)
+        if self._check_condition(step):
+            step.status = Status.READY
+            heapq.heappush(self.ready_queue, (self._priority(step), self._seq, step))
+            self._seq += 1
+        else:
+            step.status = Status.SKIPPED
+
+    def _notify_completed(self, step: Step):
+        """Propagate a step's success to its direct dependents.
+
+        Decrements each successor's remaining-dependency counter; a
+        successor whose counter hits zero becomes ready (or skipped if
+        its condition fails).  This is O(out-degree) per completion
+        instead of a full workflow scan.
+        """
+        for succ in self._decrement_successors(step):
+            self._mark_ready(succ)
+
+    def _decrement_successors(self, step: Step):
+        """Atomically decrement successor counters; return the newly ready.
+
+        Only the counter array is guarded here, by its own small lock:
+        concurrent completions contend on this brief decrement instead
+        of on the engine's main lock.
+        """
+        newly_ready = []
+        with self._counter_lock:
+            remaining = self.remaining
+            for succ in step.rev_deps:
+                remaining[succ.index] -= 1
+                if remaining[succ.index] == 0 and succ.status is Status.PENDING:
+                    newly_ready.append(succ)
+        return newly_ready
+    
+    def _skip_dependents(self, step: Step):
         """Mark all dependent steps as SKIPPED."""
-        to_skip = deque([dep_id for dep_id in self.workflow.inverse_dependencies[step_id]])
+        to_skip = deque(step.rev_deps)
         skipped = set()
-        
+
         while to_skip:
-            skip_id = to_skip.popleft()
-            if skip_id in skipped:
+            skip_step = to_skip.popleft()
+            if skip_step.id in skipped:
                 continue
-            
-            skip_step = self.workflow.steps[skip_id]
-            if skip_step.status in ["PENDING", "READY"]:
-                skip_step.status = "SKIPPED"
-                skipped.add(skip_id)
-                if skip_step in self.ready_queue:
-                    self.ready_queue.remove(skip_step)
-                to_skip.extend(self.workflow.inverse_dependencies[skip_id])
+
+            if skip_step.status in (Status.PENDING, Status.READY):
+                # If it was READY it stays in the heap as a tombstone;
+                # _get_next_step discards entries that are no longer READY
+                skip_step.status = Status.SKIPPED
+                self.dirty.add(skip_step.id)
+                skipped.add(skip_step.id)
+                to_skip.extend(skip_step.rev_deps)
     
     def visualize_workflow(self):
-        """Display current workflow status in a table format."""
-        print("\n" + "="*80)
-        print(f"{'Step ID':<10} {'Status':<10} {'Dependencies':<15} {'Command':<25} {'Retries':<8}")
-        print("-"*80)
-        
-        for step_id, step in self.workflow.steps.items():
-            deps = ", ".join(step.dependencies) if step.dependencies else "N/A"
-            deps = deps[:12] + "..." if len(deps) > 15 else deps
-            command = step.command[:22] + "..." if len(step.command) > 25 else step.command
-            
-            print(f"{step_id:<10} {step.status:<10} {deps:<15} {command:<25} {step.retry_count:<8}")
-        
-        print("="*80)
+        """Print the steps whose status changed since the last call.
+
+        Only dirty rows are emitted (and nothing at all unless verbose),
+        so status reporting stays O(changes) instead of O(steps) per
+        scheduling event.
+        """
+        if not self.verbose or not self.dirty:
+            return
+
+        for step_id in sorted(self.dirty):
+            step = self.workflow.steps[step_id]
+            retries = f" (retry {step.retry_count})" if step.retry_count else ""
+            print(f"  {step_id}: {step.status.name}{retries}")
+        self.dirty.clear()
 
 
 # ============================================================================
@@ -381,22 +719,15 @@ def run_workflow(file_path: str, strategy_name: str = "bfs", parallel: bool = Fa
     workflow = parse_workflow(file_path)
     validate_workflow(workflow)
     
-    # Choose strategy
-    strategy = None
-    if strategy_name.lower() == "bfs":
-        strategy = BreadthFirstStrategy(workflow)
-    elif strategy_name.lower() == "dfs":
-        strategy = DepthFirstStrategy(workflow)
-    
     # Create and run engine
     max_parallel = 3 if parallel else 1
-    engine = WorkflowEngine(workflow, strategy, max_parallel)
+    engine = WorkflowEngine(workflow, strategy_name.lower(), max_parallel)
     engine.execute()
     
     # Show final status
     print("\nFinal status:")
     for step_id, step in workflow.steps.items():
-        print(f"Step {step_id}: {step.status}")
+        print(f"Step {step_id}: {step.status.name}")
 
 
 # ============================================================================